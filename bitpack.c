@@ -0,0 +1,96 @@
+/*
+ * bitpack.c
+ * Native bit packing kernel for constructor.py, loaded through ctypes.
+ *
+ * emit_symbol_stream() writes the literal/length/distance symbols of one
+ * fixed or dynamic deflate block.  symbols[] holds the parsed
+ * ENCODED_BIT_STREAM: a value below 257 is a literal or the end of block
+ * code, a larger value is a length code followed by its extra bits value,
+ * the distance code and the distance extra bits value.  The code tables
+ * hold the huffman codes already bit reversed, indexed by symbol value.
+ * Nothing is range checked here, the caller validates symbols[] first
+ * (see validate_symbol_stream() in constructor.py).
+ *
+ * The pending bits are passed in and out through buf/nbits so the caller
+ * can keep writing after the block.  The return value is the number of
+ * bytes stored to out, which must have room for two bytes per symbol plus
+ * 8 bytes of slack for the last word store.
+ */
+
+#include <stddef.h>
+#include <string.h>
+
+#if defined(_WIN32)
+#  define BITPACK_EXPORT __declspec(dllexport)
+#else
+#  define BITPACK_EXPORT
+#endif
+
+#if defined(_WIN32) || (defined(__BYTE_ORDER__) && __BYTE_ORDER__ == __ORDER_LITTLE_ENDIAN__)
+#  define BITPACK_LITTLE_ENDIAN
+#endif
+
+static const unsigned char lext[29] = { /* Extra bits for length codes 257..285 */
+    0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+    3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0};
+static const unsigned char dext[30] = { /* Extra bits for distance codes 0..29 */
+    0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+    7, 7, 8, 8, 9, 9, 10, 10, 11, 11,
+    12, 12, 13, 13};
+
+BITPACK_EXPORT size_t emit_symbol_stream(const int *symbols, size_t symbol_count,
+    const unsigned int *ll_code, const unsigned char *ll_len,
+    const unsigned int *d_code, const unsigned char *d_len,
+    unsigned char *out, unsigned long long *buf_io, unsigned int *nbits_io)
+{
+    unsigned long long buf = *buf_io;
+    unsigned int nbits = *nbits_io;
+    size_t out_pos = 0;
+    size_t symbol_index = 0;
+    int symbol_value;
+    int distance_value;
+    unsigned int extra_bits;
+
+    while (symbol_index < symbol_count) {
+        symbol_value = symbols[symbol_index];
+        buf |= (unsigned long long)ll_code[symbol_value] << nbits;
+        nbits += ll_len[symbol_value];
+
+        if (symbol_value > 256) {
+            extra_bits = lext[symbol_value - 257];
+            buf |= (unsigned long long)(symbols[symbol_index + 1] &
+                ((1u << extra_bits) - 1)) << nbits;
+            nbits += extra_bits;
+
+            distance_value = symbols[symbol_index + 2];
+            buf |= (unsigned long long)d_code[distance_value] << nbits;
+            nbits += d_len[distance_value];
+
+            extra_bits = dext[distance_value];
+            buf |= (unsigned long long)(symbols[symbol_index + 3] &
+                ((1u << extra_bits) - 1)) << nbits;
+            nbits += extra_bits;
+            symbol_index += 4;
+        } else {
+            symbol_index++;
+        }
+
+        /* at most 7 + 48 bits are pending here, well inside 64 bits */
+#ifdef BITPACK_LITTLE_ENDIAN
+        memcpy(out + out_pos, &buf, sizeof(buf));
+        out_pos += nbits >> 3;
+        buf >>= nbits & ~7u;
+        nbits &= 7;
+#else
+        while (nbits >= 8) {
+            out[out_pos++] = (unsigned char)buf;
+            buf >>= 8;
+            nbits -= 8;
+        }
+#endif
+    }
+
+    *buf_io = buf;
+    *nbits_io = nbits;
+    return out_pos;
+}
@@ -3,280 +3,497 @@
 import os
 import sys
 import json
+import ctypes
+from array import array
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+    njit = None
+
+LENGTH_EXTRA_BITS_TABLE = (0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+    3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0)
+
+DISTANCE_EXTRA_BITS_TABLE = (
+    0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+    7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13)
+
+REVERSED_BYTE_TABLE = tuple(int("{:08b}".format(i)[::-1], 2) for i in range(256))
+
+def reverse_bits(int_val, bit_size):
+    # huffman codes are at most 15 bits, reverse them as a 16 bit value
+    return ((REVERSED_BYTE_TABLE[int_val & 0xff] << 8) |
+        REVERSED_BYTE_TABLE[(int_val >> 8) & 0xff]) >> (16 - bit_size)
+
+class BitWriter:
+    def __init__(self, size_hint=0):
+        self.out = bytearray(size_hint)
+        self.pos = 0
+        self.buf = 0
+        self.nbits = 0
+
+    def reserve(self, byte_size):
+        if self.pos + byte_size > len(self.out):
+            self.out += bytes(self.pos + byte_size - len(self.out))
+
+    def put_bits(self, int_val, bit_size):
+        self.buf |= (int_val & ((1 << bit_size) - 1)) << self.nbits
+        self.nbits += bit_size
+        while self.nbits >= 32:
+            self.out[self.pos:self.pos + 4] = (self.buf & 0xffffffff).to_bytes(4, "little")
+            self.pos += 4
+            self.buf >>= 32
+            self.nbits -= 32
+
+    def drain(self):
+        # write out the whole bytes of the pending bits, keeping less than 8
+        byte_size = self.nbits >> 3
+        if byte_size:
+            self.out[self.pos:self.pos + byte_size] = (
+                self.buf & ((1 << (byte_size << 3)) - 1)).to_bytes(byte_size, "little")
+            self.pos += byte_size
+            self.buf >>= byte_size << 3
+            self.nbits &= 7
+
+    def align(self):
+        self.nbits = (self.nbits + 7) & ~7
+        self.drain()
+
+    def put_bytes(self, data):
+        self.align()
+        self.out[self.pos:self.pos + len(data)] = data
+        self.pos += len(data)
+
+    def flush(self):
+        self.align()
+
+    def getbuffer(self):
+        return memoryview(self.out)[:self.pos]
+
+def emit_symbol_stream(symbols, ll_code, ll_len, d_code, d_len,
+        length_extra_bits_table, distance_extra_bits_table, out, buf, nbits):
+    out_pos = 0
+    symbol_index = 0
+    symbol_count = symbols.shape[0]
+    while symbol_index < symbol_count:
+        symbol_value = symbols[symbol_index]
+        buf |= ll_code[symbol_value] << nbits
+        nbits += ll_len[symbol_value]
+        if symbol_value > 256:
+            extra_bits = length_extra_bits_table[symbol_value - 257]
+            buf |= (symbols[symbol_index + 1] & ((1 << extra_bits) - 1)) << nbits
+            nbits += extra_bits
+
+            distance_value = symbols[symbol_index + 2]
+            buf |= d_code[distance_value] << nbits
+            nbits += d_len[distance_value]
+
+            extra_bits = distance_extra_bits_table[distance_value]
+            buf |= (symbols[symbol_index + 3] & ((1 << extra_bits) - 1)) << nbits
+            nbits += extra_bits
+            symbol_index += 4
+        else:
+            symbol_index += 1
+
+        while nbits >= 8:
+            out[out_pos] = buf & 0xff
+            out_pos += 1
+            buf >>= 8
+            nbits -= 8
+
+    return out_pos, buf, nbits
+
+if njit is not None:
+    emit_symbol_stream = njit(cache=True)(emit_symbol_stream)
+
+def construct_symbol_stream_jit(writer, decoded_symbol_list, stream_bit_size,
+        ll_code, ll_len, d_code, d_len):
+    symbols = np.array(decoded_symbol_list, dtype=np.int64)
+
+    ll_code = np.array(ll_code, dtype=np.int64)
+    ll_len = np.array(ll_len, dtype=np.int64)
+    d_code = np.array(d_code, dtype=np.int64)
+    d_len = np.array(d_len, dtype=np.int64)
+
+    writer.drain()
+    writer.reserve((writer.nbits + stream_bit_size) >> 3)
+    out = np.frombuffer(writer.out, dtype=np.uint8)[writer.pos:]
+    out_pos, writer.buf, writer.nbits = emit_symbol_stream(symbols,
+        ll_code, ll_len, d_code, d_len,
+        np.array(LENGTH_EXTRA_BITS_TABLE, dtype=np.int64),
+        np.array(DISTANCE_EXTRA_BITS_TABLE, dtype=np.int64),
+        out, writer.buf, writer.nbits)
+    # release the view so the bytearray can be resized again
+    del out
+    writer.pos += out_pos
+
+def load_bitpack_library():
+    if sys.platform == "win32":
+        library_name = "bitpack.dll"
+    elif sys.platform == "darwin":
+        library_name = "libbitpack.dylib"
+    else:
+        library_name = "libbitpack.so"
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for library_dir in (script_dir, os.path.join(script_dir, "build", "output")):
+        library_path = os.path.join(library_dir, library_name)
+        if not os.path.exists(library_path):
+            continue
+        try:
+            library = ctypes.CDLL(library_path)
+        except OSError:
+            continue
+        library.emit_symbol_stream.restype = ctypes.c_size_t
+        library.emit_symbol_stream.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t,
+            ctypes.c_void_p, ctypes.c_void_p,
+            ctypes.c_void_p, ctypes.c_void_p,
+            ctypes.c_void_p,
+            ctypes.POINTER(ctypes.c_ulonglong), ctypes.POINTER(ctypes.c_uint)]
+        return library
+    return None
+
+bitpack_library = load_bitpack_library()
+
+def construct_symbol_stream_native(writer, decoded_symbol_list, stream_bit_size,
+        ll_code, ll_len, d_code, d_len):
+    symbols = array("i", decoded_symbol_list)
+    ll_code = array("I", ll_code)
+    # unset entries are never read once the stream is validated
+    ll_len = array("B", [max(bit_size, 0) for bit_size in ll_len])
+    d_code = array("I", d_code)
+    d_len = array("B", [max(bit_size, 0) for bit_size in d_len])
+
+    # the kernel stores whole 64-bit words, leave room for the last one
+    writer.drain()
+    writer.reserve(((writer.nbits + stream_bit_size) >> 3) + 8)
+    out = (ctypes.c_ubyte * (len(writer.out) - writer.pos)).from_buffer(writer.out, writer.pos)
+    buf = ctypes.c_ulonglong(writer.buf)
+    nbits = ctypes.c_uint(writer.nbits)
+    out_size = bitpack_library.emit_symbol_stream(
+        symbols.buffer_info()[0], len(symbols),
+        ll_code.buffer_info()[0], ll_len.buffer_info()[0],
+        d_code.buffer_info()[0], d_len.buffer_info()[0],
+        ctypes.addressof(out), ctypes.byref(buf), ctypes.byref(nbits))
+    # release the view so the bytearray can be resized again
+    del out
+    writer.pos += out_size
+    writer.buf = buf.value
+    writer.nbits = nbits.value
+
+def parse_symbol_stream(encoded_bit_stream):
+    # literals are dumped as hex bytes, everything else (end of block,
+    # length, distance and extra bits) as decimal numbers
+    return [int(symbol, 16) if symbol[1:2] == "x" else int(symbol)
+        for symbol in " ".join(encoded_bit_stream).split()]
+
+def validate_symbol_stream(decoded_symbol_list, ll_len, d_len):
+    # the compiled kernels index their tables without any checks, so reject
+    # anything they could read out of bounds or a symbol the huffman tables
+    # have no code for, and return the encoded size in bits
+    stream_bit_size = 0
+    symbol_list_length = len(decoded_symbol_list)
+    symbol_list_index = 0
+    while symbol_list_index < symbol_list_length:
+        symbol_value = decoded_symbol_list[symbol_list_index]
+        if not 0 <= symbol_value <= 285:
+            raise ValueError("invalid literal/length symbol %d at token %d" %
+                (symbol_value, symbol_list_index))
+        if ll_len[symbol_value] <= 0:
+            raise ValueError("literal/length symbol %d at token %d is not in the huffman table" %
+                (symbol_value, symbol_list_index))
+        stream_bit_size += ll_len[symbol_value]
+        if symbol_value > 256:
+            if symbol_list_index + 3 >= symbol_list_length:
+                raise ValueError("truncated length/distance match at token %d" %
+                    symbol_list_index)
+            distance_value = decoded_symbol_list[symbol_list_index + 2]
+            if not 0 <= distance_value <= 29:
+                raise ValueError("invalid distance symbol %d at token %d" %
+                    (distance_value, symbol_list_index + 2))
+            if d_len[distance_value] <= 0:
+                raise ValueError("distance symbol %d at token %d is not in the huffman table" %
+                    (distance_value, symbol_list_index + 2))
+            stream_bit_size += (LENGTH_EXTRA_BITS_TABLE[symbol_value - 257] +
+                d_len[distance_value] + DISTANCE_EXTRA_BITS_TABLE[distance_value])
+            symbol_list_index += 4
+        else:
+            symbol_list_index += 1
 
-byte_val = 0
-bit_cnt = 0
+    return stream_bit_size
+
+def parse_hex_bytes(hex_str_list):
+    # the string dumper writes bytes as 0xNN, x is not a hex digit so the
+    # prefix can be dropped from the whole text at once
+    hex_str = " ".join(hex_str_list).replace("0x", "").replace("0X", "")
+    try:
+        return bytes.fromhex(hex_str)
+    except ValueError:
+        # fall back for bytes written without a leading zero
+        return bytes.fromhex("".join(hex_val.zfill(2) for hex_val in hex_str.split()))
+
+def build_huffman_lut(huffman_table_json, table_size):
+    # symbols without a code keep a bit size of -1 so they can be rejected
+    code_table = [0] * table_size
+    bit_size_table = [-1] * table_size
+    for items in huffman_table_json.get("items", []):
+        code_table[items["symbol_value"]] = reverse_bits(items["encoded_value"],
+            items["encoded_bit_size"])
+        bit_size_table[items["symbol_value"]] = items["encoded_bit_size"]
+    return code_table, bit_size_table
 
 def write_byte_array_2_file(byte_array, file_path):
-    with open(file_path, "wb") as f:
-        f.write(byte_array)
-
-def construct_val_2_bits(byte_array, int_val, bit_size):
-    global byte_val
-    global bit_cnt
-    for i in range(bit_size):
-        byte_val |= ((int_val >> i) & 0x1) << bit_cnt
-        bit_cnt += 1
-        if (bit_cnt == 8):
-            byte_array.append(byte_val)
-            bit_cnt = 0
-            byte_val = 0
-
-def construct_stream_2_bits(byte_array, int_val, bit_size):
-    global byte_val
-    global bit_cnt
-    for i in range(bit_size):
-        byte_val |= ((int_val >> (bit_size - 1 - i)) & 0x1) << bit_cnt
-        bit_cnt += 1
-        if (bit_cnt == 8):
-            byte_array.append(byte_val)
-            bit_cnt = 0
-            byte_val = 0
-
-def fill_reserved_bits_with_0(byte_array):
-    global byte_val
-    global bit_cnt
-    if bit_cnt != 0:
-        for i in range(8 - bit_cnt):
-            byte_val |= 0 << bit_cnt
-            bit_cnt += 1
-            if (bit_cnt == 8):
-                byte_array.append(byte_val)
-                bit_cnt = 0
-                byte_val = 0
-
-def flush_final(byte_array):
-    global byte_val
-    global bit_cnt
-    if bit_cnt != 0:
-        byte_array.append(byte_val)
-        bit_cnt = 0
-        byte_val = 0
-
-def construct_deflate_header(json_data, byte_array):
-    construct_val_2_bits(byte_array, json_data["BFINAL"]["value"],
-        json_data["BFINAL"]["bit_size"])
-
-def construct_deflate_stored_block(json_data, byte_array):
-    fill_reserved_bits_with_0(byte_array)
-    construct_val_2_bits(byte_array, json_data["LEN"]["value"],
-        json_data["LEN"]["bit_size"])
-    construct_val_2_bits(byte_array, json_data["NLEN"]["value"],
-        json_data["NLEN"]["bit_size"])
-
-    raw_data_list = []
-    for raw_data_str in json_data["RAW_DATA"]:
-        symbol_list = list(filter(lambda x : x, raw_data_str.split(" ")))
-        raw_data_list += symbol_list
-
-    if raw_data_list:
-        for raw_data in raw_data_list:
-            byte_array.append(int(raw_data, 16))
-
-def construct_deflate_fix_block(json_data, byte_array):
-    length_extra_bits_table = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
-        3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0]
-
-    distance_extra_bits_table = [
-        0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
-        7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]
-
-    literal_length_huffman_table = []
-    distance_huffman_table = []
-    literal_length_symbol_dict = {}
-    distance_symbol_dict = {}
-
-    literal_length_huffman_table = json_data["extracted_literal_length_huffman_table"]["items"]
-    for items in literal_length_huffman_table:
-        literal_length_symbol_dict[items["symbol_value"]] = items["index"]
-
-    if "items" in json_data["extracted_distance_huffman_table"]:
-        distance_huffman_table = json_data["extracted_distance_huffman_table"]["items"]
-        for items in distance_huffman_table:
-            distance_symbol_dict[items["symbol_value"]] = items["index"]
-
-    decoded_symbol_list = []
-    for symbol_str in json_data["ENCODED_BIT_STREAM"]:
-        symbol_list = list(filter(lambda x : x, symbol_str.split(" ")))
-        decoded_symbol_list += symbol_list
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC |
+        getattr(os, "O_BINARY", 0), 0o644)
+    try:
+        data = memoryview(byte_array)
+        while data:
+            data = data[os.write(fd, data):]
+    finally:
+        os.close(fd)
+
+def construct_field_2_bits(writer, field_json):
+    writer.put_bits(field_json["value"], field_json["bit_size"])
+
+def construct_deflate_header(json_data, writer):
+    construct_field_2_bits(writer, json_data["BFINAL"])
+
+def construct_deflate_stored_block(json_data, writer):
+    writer.align()
+    construct_field_2_bits(writer, json_data["LEN"])
+    construct_field_2_bits(writer, json_data["NLEN"])
+
+    writer.put_bytes(parse_hex_bytes(json_data["RAW_DATA"]))
+
+def construct_symbol_stream(json_data, writer):
+    ll_code, ll_len = build_huffman_lut(
+        json_data["extracted_literal_length_huffman_table"], 288)
+    d_code, d_len = build_huffman_lut(
+        json_data["extracted_distance_huffman_table"], 32)
+
+    decoded_symbol_list = parse_symbol_stream(json_data["ENCODED_BIT_STREAM"])
+    stream_bit_size = validate_symbol_stream(decoded_symbol_list, ll_len, d_len)
+
+    if bitpack_library is not None:
+        construct_symbol_stream_native(writer, decoded_symbol_list, stream_bit_size,
+            ll_code, ll_len, d_code, d_len)
+        return
+    if njit is not None:
+        construct_symbol_stream_jit(writer, decoded_symbol_list, stream_bit_size,
+            ll_code, ll_len, d_code, d_len)
+        return
 
     symbol_list_length = len(decoded_symbol_list)
+    writer.reserve((writer.nbits + stream_bit_size) >> 3)
+
+    out = writer.out
+    pos = writer.pos
+    length_extra_bits_table = LENGTH_EXTRA_BITS_TABLE
+    distance_extra_bits_table = DISTANCE_EXTRA_BITS_TABLE
+    buf = writer.buf
+    nbits = writer.nbits
+
     symbol_list_index = 0
     while (symbol_list_index < symbol_list_length):
-        if "0x" in decoded_symbol_list[symbol_list_index]:
-            symbol_value = int(decoded_symbol_list[symbol_list_index], 16)
-            huffman_table_index = literal_length_symbol_dict[symbol_value]
-            construct_stream_2_bits(byte_array,
-                literal_length_huffman_table[huffman_table_index]["encoded_value"],
-                literal_length_huffman_table[huffman_table_index]["encoded_bit_size"])
-            symbol_list_index += 1
-        elif "256" == decoded_symbol_list[symbol_list_index]:
-            symbol_value = int(decoded_symbol_list[symbol_list_index])
-            huffman_table_index = literal_length_symbol_dict[symbol_value]
-            construct_stream_2_bits(byte_array,
-                literal_length_huffman_table[huffman_table_index]["encoded_value"],
-                literal_length_huffman_table[huffman_table_index]["encoded_bit_size"])
-            symbol_list_index += 1
-        else:
-            length_value = int(decoded_symbol_list[symbol_list_index])
-            huffman_table_index = literal_length_symbol_dict[length_value]
-            construct_stream_2_bits(byte_array,
-                literal_length_huffman_table[huffman_table_index]["encoded_value"],
-                literal_length_huffman_table[huffman_table_index]["encoded_bit_size"])
-
-            length_extra_value = int(decoded_symbol_list[symbol_list_index + 1])
-            length_extra_bits = length_extra_bits_table[length_value - 257]
-            construct_val_2_bits(byte_array, length_extra_value,
-            length_extra_bits)
-
-            distance_value = int(decoded_symbol_list[symbol_list_index + 2])
-            huffman_table_index = distance_symbol_dict[distance_value]
-            construct_stream_2_bits(byte_array,
-                distance_huffman_table[huffman_table_index]["encoded_value"],
-                distance_huffman_table[huffman_table_index]["encoded_bit_size"])
-
-            distance_extra_value = int(decoded_symbol_list[symbol_list_index + 3])
+        symbol_value = decoded_symbol_list[symbol_list_index]
+        if symbol_value > 256:
+            # pack length code, length extra, distance code and distance
+            # extra (at most 15 + 5 + 15 + 13 bits) before one buffer update
+            length_extra_value = decoded_symbol_list[symbol_list_index + 1]
+            length_extra_bits = length_extra_bits_table[symbol_value - 257]
+            packed_bits = ll_len[symbol_value]
+            packed = ll_code[symbol_value] | (
+                (length_extra_value & ((1 << length_extra_bits) - 1)) << packed_bits)
+            packed_bits += length_extra_bits
+
+            distance_value = decoded_symbol_list[symbol_list_index + 2]
+            packed |= d_code[distance_value] << packed_bits
+            packed_bits += d_len[distance_value]
+
+            distance_extra_value = decoded_symbol_list[symbol_list_index + 3]
             distance_extra_bits = distance_extra_bits_table[distance_value]
-            construct_val_2_bits(byte_array, distance_extra_value,
-            distance_extra_bits)
+            packed |= (distance_extra_value & ((1 << distance_extra_bits) - 1)) << packed_bits
+            packed_bits += distance_extra_bits
 
+            buf |= packed << nbits
+            nbits += packed_bits
             symbol_list_index += 4
+        else:
+            buf |= ll_code[symbol_value] << nbits
+            nbits += ll_len[symbol_value]
+            symbol_list_index += 1
 
-def construct_deflate_dynamic_block(json_data, byte_array):
-    length_extra_bits_table = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
-        3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0]
+        while nbits >= 32:
+            out[pos:pos + 4] = (buf & 0xffffffff).to_bytes(4, "little")
+            pos += 4
+            buf >>= 32
+            nbits -= 32
 
-    distance_extra_bits_table = [
-        0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
-        7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13]
+    writer.pos = pos
+    writer.buf = buf
+    writer.nbits = nbits
 
-    literal_length_huffman_table = []
-    distance_huffman_table = []
-    literal_length_symbol_dict = {}
-    distance_symbol_dict = {}
+def construct_deflate_fix_block(json_data, writer):
+    construct_symbol_stream(json_data, writer)
 
-    construct_val_2_bits(byte_array, json_data["HLIT"]["value"],
-        json_data["HLIT"]["bit_size"])
-    construct_val_2_bits(byte_array, json_data["HDIST"]["value"],
-        json_data["HDIST"]["bit_size"])
-    construct_val_2_bits(byte_array, json_data["HCLEN"]["value"],
-        json_data["HCLEN"]["bit_size"])
+def construct_deflate_dynamic_block(json_data, writer):
+    construct_field_2_bits(writer, json_data["HLIT"])
+    construct_field_2_bits(writer, json_data["HDIST"])
+    construct_field_2_bits(writer, json_data["HCLEN"])
 
+    put_bits = writer.put_bits
     for code_length in json_data["CODE_LENGTH_TABLE"]:
         if code_length["stored"]:
-            construct_val_2_bits(byte_array, code_length["value"],
-            code_length["bit_size"])
+            put_bits(code_length["value"], code_length["bit_size"])
 
     for literal_length_distance in json_data["LITERAL_LENGTH_DISTANCE_TABLE"]:
-        construct_stream_2_bits(byte_array, literal_length_distance["value"],
-        literal_length_distance["bit_size"])
-        if "extra" in literal_length_distance:
-            construct_val_2_bits(byte_array, literal_length_distance["extra"]["value"],
-            literal_length_distance["extra"]["bit_size"])
-
-    literal_length_huffman_table = json_data["extracted_literal_length_huffman_table"]["items"]
-    for items in literal_length_huffman_table:
-        literal_length_symbol_dict[items["symbol_value"]] = items["index"]
-
-    if "items" in json_data["extracted_distance_huffman_table"]:
-        distance_huffman_table = json_data["extracted_distance_huffman_table"]["items"]
-        for items in distance_huffman_table:
-            distance_symbol_dict[items["symbol_value"]] = items["index"]
-
-    decoded_symbol_list = []
-    for symbol_str in json_data["ENCODED_BIT_STREAM"]:
-        symbol_list = list(filter(lambda x : x, symbol_str.split(" ")))
-        decoded_symbol_list += symbol_list
+        bit_size = literal_length_distance["bit_size"]
+        put_bits(reverse_bits(literal_length_distance["value"], bit_size), bit_size)
+        extra_json = literal_length_distance.get("extra")
+        if extra_json is not None:
+            put_bits(extra_json["value"], extra_json["bit_size"])
+
+    construct_symbol_stream(json_data, writer)
+
+def construct_deflate_block(json_data, writer):
+    construct_deflate_header(json_data, writer)
+    if json_data["BTYPE"]["value"] == 0:
+        construct_deflate_stored_block(json_data, writer)
+    elif json_data["BTYPE"]["value"] == 1:
+        construct_deflate_fix_block(json_data, writer)
+    elif json_data["BTYPE"]["value"] == 2:
+        construct_deflate_dynamic_block(json_data, writer)
+
+def construct_deflate_bin(json_data, writer):
+    for deflate_block in json_data:
+        construct_deflate_block(deflate_block, writer)
 
-    symbol_list_length = len(decoded_symbol_list)
-    symbol_list_index = 0
-    while (symbol_list_index < symbol_list_length):
-        if "0x" in decoded_symbol_list[symbol_list_index]:
-            symbol_value = int(decoded_symbol_list[symbol_list_index], 16)
-            huffman_table_index = literal_length_symbol_dict[symbol_value]
-            construct_stream_2_bits(byte_array,
-                literal_length_huffman_table[huffman_table_index]["encoded_value"],
-                literal_length_huffman_table[huffman_table_index]["encoded_bit_size"])
-            symbol_list_index += 1
-        elif "256" == decoded_symbol_list[symbol_list_index]:
-            symbol_value = int(decoded_symbol_list[symbol_list_index])
-            huffman_table_index = literal_length_symbol_dict[symbol_value]
-            construct_stream_2_bits(byte_array,
-                literal_length_huffman_table[huffman_table_index]["encoded_value"],
-                literal_length_huffman_table[huffman_table_index]["encoded_bit_size"])
-            symbol_list_index += 1
-        else:
-            length_value = int(decoded_symbol_list[symbol_list_index])
-            huffman_table_index = literal_length_symbol_dict[length_value]
-            construct_stream_2_bits(byte_array,
-                literal_length_huffman_table[huffman_table_index]["encoded_value"],
-                literal_length_huffman_table[huffman_table_index]["encoded_bit_size"])
-
-            length_extra_value = int(decoded_symbol_list[symbol_list_index + 1])
-            length_extra_bits = length_extra_bits_table[length_value - 257]
-            construct_val_2_bits(byte_array, length_extra_value,
-            length_extra_bits)
-
-            distance_value = int(decoded_symbol_list[symbol_list_index + 2])
-            huffman_table_index = distance_symbol_dict[distance_value]
-            construct_stream_2_bits(byte_array,
-                distance_huffman_table[huffman_table_index]["encoded_value"],
-                distance_huffman_table[huffman_table_index]["encoded_bit_size"])
-
-            distance_extra_value = int(decoded_symbol_list[symbol_list_index + 3])
-            distance_extra_bits = distance_extra_bits_table[distance_value]
-            construct_val_2_bits(byte_array, distance_extra_value,
-            distance_extra_bits)
+    writer.flush()
 
-            symbol_list_index += 4
+def construct_zlib_header(json_data, writer):
+    construct_field_2_bits(writer, json_data["COMPRESSION_METHOD"])
+    construct_field_2_bits(writer, json_data["COMPRESSION_INFO"])
+
+    flags_json = json_data["FLAGS"]
+    construct_field_2_bits(writer, flags_json["FCHECK"])
+    construct_field_2_bits(writer, flags_json["FDICT"])
+    construct_field_2_bits(writer, flags_json["FLEVEL"])
+
+def construct_zlib_footer(json_data, writer):
+    writer.put_bytes(parse_hex_bytes(json_data["value"]))
+
+def construct_zlib_bin(json_data, writer):
+    construct_zlib_header(json_data["ZLIB_HEADER"], writer)
+    construct_deflate_bin(json_data["DEFLATE_BLOCK"], writer)
+    construct_zlib_footer(json_data["CHECKSUM_IN_FILE"], writer)
 
-def construct_deflate_bin(json_data, byte_array):
+def estimate_deflate_size(json_data):
+    size = 0
     for deflate_block in json_data:
-        construct_deflate_header(deflate_block, byte_array)
-        if deflate_block["BTYPE"]["value"] == 0:
-            construct_deflate_stored_block(deflate_block, byte_array)
-        elif deflate_block["BTYPE"]["value"] == 1:
-            construct_deflate_fix_block(deflate_block, byte_array)
-        elif deflate_block["BTYPE"]["value"] == 2:
-            construct_deflate_dynamic_block(deflate_block, byte_array)
-
-    flush_final(byte_array)
-
-def construct_zlib_header(json_data, byte_array):
-    construct_val_2_bits(byte_array, json_data["COMPRESSION_METHOD"]["value"],
-        json_data["COMPRESSION_METHOD"]["bit_size"])
-    construct_val_2_bits(byte_array, json_data["COMPRESSION_INFO"]["value"],
-        json_data["COMPRESSION_INFO"]["bit_size"])
-
-    construct_val_2_bits(byte_array, json_data["FLAGS"]["FCHECK"]["value"],
-        json_data["FLAGS"]["FCHECK"]["bit_size"])
-    construct_val_2_bits(byte_array, json_data["FLAGS"]["FDICT"]["value"],
-        json_data["FLAGS"]["FDICT"]["bit_size"])
-    construct_val_2_bits(byte_array, json_data["FLAGS"]["FLEVEL"]["value"],
-        json_data["FLAGS"]["FLEVEL"]["bit_size"])
-
-def construct_zlib_footer(json_data, byte_array):
-    for checksum_str in json_data["value"]:
-        checksum_list = list(filter(lambda x : x, checksum_str.split(" ")))
-        for checksum_val in checksum_list:
-            byte_array.append(int(checksum_val, 16))
-
-def construct_zlib_bin(json_data, byte_array):
-    construct_zlib_header(json_data["ZLIB_HEADER"], byte_array)
-    construct_deflate_bin(json_data["DEFLATE_BLOCK"], byte_array)
-    construct_zlib_footer(json_data["CHECKSUM_IN_FILE"], byte_array)
+        block_type = deflate_block["BTYPE"]["value"]
+        if block_type == 0:
+            size += 5 + deflate_block["LEN"]["value"]
+        elif "BLOCK_BIT_SIZE" in deflate_block:
+            size += (deflate_block["BLOCK_BIT_SIZE"] + 7) >> 3
+        elif block_type == 1 or block_type == 2:
+            # about a byte per symbol token, reserve() grows the buffer to
+            # the exact size of the block if it needs more
+            size += sum(symbol_str.count(" ")
+                for symbol_str in deflate_block.get("ENCODED_BIT_STREAM", [])) + 16
+            if "LITERAL_LENGTH_DISTANCE_TABLE" in deflate_block:
+                size += 2 * len(deflate_block["LITERAL_LENGTH_DISTANCE_TABLE"]) + 10
+        else:
+            size += 1
+    return size
+
+def estimate_size(json_data):
+    if "ZLIB_FORMAT" in json_data:
+        return estimate_deflate_size(json_data["ZLIB_FORMAT"]["DEFLATE_BLOCK"]) + 6
+    elif "DEFLATE_BLOCK" in json_data:
+        return estimate_deflate_size(json_data["DEFLATE_BLOCK"])
+    return 0
 
 def construct_compressed_bin(json_data, output_file_path):
     output_file_name = output_file_path
-    compressed_byte_array = bytearray()
+    writer = BitWriter(estimate_size(json_data))
     if "ZLIB_FORMAT" in json_data:
-        construct_zlib_bin(json_data["ZLIB_FORMAT"], compressed_byte_array)
+        construct_zlib_bin(json_data["ZLIB_FORMAT"], writer)
         output_file_name += ".zlib"
     elif "DEFLATE_BLOCK" in json_data:
-        construct_deflate_bin(json_data["DEFLATE_BLOCK"], compressed_byte_array)
+        construct_deflate_bin(json_data["DEFLATE_BLOCK"], writer)
         output_file_name += ".defl"
 
-    write_byte_array_2_file(compressed_byte_array, output_file_name)
+    write_byte_array_2_file(writer.getbuffer(), output_file_name)
+
+# objects built one at a time when streaming the JSON, deflate blocks are
+# written as soon as they are parsed while the small zlib header and
+# checksum are kept until they can be placed, whatever the key order
+STREAMED_OBJECT_PREFIXES = (
+    "ZLIB_FORMAT.ZLIB_HEADER",
+    "ZLIB_FORMAT.DEFLATE_BLOCK.item",
+    "ZLIB_FORMAT.CHECKSUM_IN_FILE",
+    "DEFLATE_BLOCK.item",
+)
+
+def construct_compressed_bin_stream(json_file, output_file_path):
+    output_file_name = output_file_path
+    writer = BitWriter()
+    is_zlib_format = False
+    zlib_header_json = None
+    zlib_header_written = False
+    checksum_json = None
+    builder = None
+    builder_prefix = None
+    for prefix, event, value in ijson.parse(json_file):
+        if builder is not None:
+            builder.event(event, value)
+            if event != "end_map" or prefix != builder_prefix:
+                continue
+            if builder_prefix == "ZLIB_FORMAT.ZLIB_HEADER":
+                zlib_header_json = builder.value
+            elif builder_prefix == "ZLIB_FORMAT.CHECKSUM_IN_FILE":
+                checksum_json = builder.value
+            else:
+                if builder_prefix == "ZLIB_FORMAT.DEFLATE_BLOCK.item" and \
+                        not zlib_header_written and zlib_header_json is not None:
+                    construct_zlib_header(zlib_header_json, writer)
+                    zlib_header_written = True
+                construct_deflate_block(builder.value, writer)
+            builder = None
+        elif event == "start_map" and prefix in STREAMED_OBJECT_PREFIXES:
+            builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            builder_prefix = prefix
+        elif event == "map_key" and prefix == "":
+            if value == "ZLIB_FORMAT":
+                is_zlib_format = True
+                output_file_name += ".zlib"
+            elif value == "DEFLATE_BLOCK":
+                output_file_name += ".defl"
+
+    writer.flush()
+    if is_zlib_format:
+        if zlib_header_json is None:
+            raise KeyError("ZLIB_HEADER")
+        if checksum_json is None:
+            raise KeyError("CHECKSUM_IN_FILE")
+        if not zlib_header_written:
+            # the header came after the deflate blocks, put it in front
+            header_writer = BitWriter()
+            construct_zlib_header(zlib_header_json, header_writer)
+            header_writer.put_bytes(writer.getbuffer())
+            writer = header_writer
+        construct_zlib_footer(checksum_json, writer)
+
+    write_byte_array_2_file(writer.getbuffer(), output_file_name)
 
 def main():
     if len(sys.argv) < 2:
@@ -287,6 +504,11 @@ def main():
         print(compressed_json_file + " not exists!")
         sys.exit(0)
 
+    if ijson is not None:
+        with open(compressed_json_file, "rb") as f:
+            construct_compressed_bin_stream(f, compressed_json_file)
+        return
+
     with open(compressed_json_file) as f:
         json_data = json.load(f)
         construct_compressed_bin(json_data, compressed_json_file)